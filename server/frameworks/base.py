@@ -2,11 +2,16 @@
 
 from __future__ import annotations
 
+import os
+import threading
+import time
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import List, Pattern, Sequence
+from typing import Iterable, Iterator, List, Pattern, Sequence
+
+from ..patterns import compile_regex
 
 
 @dataclass(slots=True)
@@ -26,34 +31,123 @@ class SessionContext:
 
     session_id: str
     entries: Sequence[HistoryEntry]
+    #: Entry texts in entry order, kept alongside ``entries`` so regex scans can
+    #: iterate plain strings instead of going through each entry object.
+    texts: tuple[str, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.texts = tuple(entry.text for entry in self.entries)
 
     @property
     def full_text(self) -> str:
         """Return the aggregated textual content of the session."""
 
-        return "\n".join(entry.text for entry in self.entries if entry.text)
+        return "\n".join(text for text in self.texts if text)
+
+
+def scan_files(root: Path | str, suffix: str) -> Iterator[os.DirEntry[str]]:
+    """Recursively yield regular files below ``root`` whose name ends with ``suffix``.
+
+    Uses ``os.scandir`` so file type checks and ``stat`` results come from the
+    directory entry cache. Symlinked directories are not descended into,
+    matching ``Path.rglob``.
+    """
+
+    pending = [os.fspath(root)]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = list(iterator)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                pending.append(entry.path)
+            elif entry.name.endswith(suffix) and entry.is_file():
+                yield entry
+
+
+def files_version(paths: Iterable[Path | os.DirEntry[str]]) -> tuple[int, int, int]:
+    """Return a stat-only fingerprint (count, newest mtime, total size) of ``paths``.
+
+    ``os.DirEntry`` objects from :func:`scan_files` reuse their cached stat result.
+    """
+
+    count = newest = total = 0
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        count += 1
+        newest = max(newest, stat.st_mtime_ns)
+        total += stat.st_size
+    return count, newest, total
 
 
 class SessionHistoryProvider(ABC):
     """Abstract base class for frameworks that expose session history."""
 
+    #: Maximum age in seconds of a cached context before it is reloaded regardless
+    #: of whether the backing files appear unchanged.
+    context_ttl: float = 60.0
+
     def __init__(self, history_root: Path):
         self.history_root = history_root
+        self._context_cache: dict[str, tuple[float, object, SessionContext]] = {}
+        # Sync tools run in a thread pool, so calls can overlap.
+        self._context_lock = threading.Lock()
 
     @abstractmethod
     def load_context(self, session_id: str) -> SessionContext:
         """Return the session context for the given agent session."""
 
-    def search(self, session_id: str, pattern: Pattern[str] | str) -> List[HistoryEntry]:
-        """Return history entries whose text matches the provided regex pattern."""
+    def context_version(self, session_id: str) -> object | None:
+        """Return a cheap fingerprint of the history backing ``session_id``.
+
+        Providers override this with a stat-only computation so that
+        :meth:`cached_context` can detect changes without re-parsing history.
+        Returning ``None`` disables caching.
+        """
+
+        return None
+
+    def cached_context(self, session_id: str) -> SessionContext:
+        """Return :meth:`load_context`, reusing the previous result while the history is unchanged."""
 
-        import re
+        now = time.monotonic()
+        with self._context_lock:
+            expired = [
+                key
+                for key, (loaded_at, _, _) in self._context_cache.items()
+                if now - loaded_at > self.context_ttl
+            ]
+            for key in expired:
+                del self._context_cache[key]
 
-        compiled = re.compile(pattern) if isinstance(pattern, str) else pattern
+        version = self.context_version(session_id)
+        with self._context_lock:
+            cached = self._context_cache.get(session_id)
+        if version is not None and cached is not None and cached[1] == version:
+            return cached[2]
+
+        # Loading happens outside the lock so other sessions are not held up.
         context = self.load_context(session_id)
-        matches: list[HistoryEntry] = []
-        for entry in context.entries:
-            if entry.text and compiled.search(entry.text):
-                matches.append(entry)
-        return matches
+        if version is not None:
+            with self._context_lock:
+                self._context_cache[session_id] = (now, version, context)
+        return context
+
+    def search(self, session_id: str, pattern: Pattern[str] | str) -> List[HistoryEntry]:
+        """Return history entries whose text matches the provided regex pattern."""
+
+        compiled = compile_regex(pattern, 0) if isinstance(pattern, str) else pattern
+        context = self.cached_context(session_id)
+        search = compiled.search
+        return [
+            context.entries[index]
+            for index, text in enumerate(context.texts)
+            if text and search(text)
+        ]
 
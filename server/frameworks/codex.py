@@ -4,16 +4,29 @@ from __future__ import annotations
 
 import json
 import logging
+import os
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Iterator
+from typing import Any, Iterable, Iterator
 
+from ..jsonutil import loads
 from . import register
-from .base import HistoryEntry, SessionContext, SessionHistoryProvider
+from .base import HistoryEntry, SessionContext, SessionHistoryProvider, files_version, scan_files
 
 
 logger = logging.getLogger(__name__)
 
+_READ_CHUNK_SIZE = 1 << 16
+
+# Raw-byte markers of rollout lines that load_context discards anyway, checked
+# before JSON decoding. Codex writes compact JSON; a marker inside a string
+# value would have its quotes escaped and therefore never match.
+_SKIPPED_LINE_MARKERS = (b'"type":"turn_context"', b'"type":"token_count"')
+
+# Codex writes session_meta as the first record of a rollout; looking a few
+# records further tolerates leading noise without reading whole files.
+_META_PEEK_LIMIT = 8
+
 
 @register("codex")
 class CodexHistoryProvider(SessionHistoryProvider):
@@ -25,68 +38,84 @@ class CodexHistoryProvider(SessionHistoryProvider):
 
         candidates = self._candidate_paths(session_id)
 
-        fallback_context: SessionContext | None = None
-        fallback_source: Path | None = None
-
+        # Only read the session_meta header of each rollout until the one
+        # belonging to this session is found; the rest are parsed in full only
+        # when no rollout matches and a fallback is needed.
+        matched: set[Path] = set()
         for path in candidates:
-            entries: list[HistoryEntry] = []
-            discovered_id: str | None = None
-            mismatch = False
-
-            for item in self._iter_jsonl(path):
-                item_type = item.get("type")
-
-                if item_type == "turn_context":
-                    continue
-
-                entry = None
-
-                if item_type == "session_meta":
-                    payload = item.get("payload") or {}
-                    meta_id = payload.get("id")
-                    if meta_id:
-                        discovered_id = discovered_id or meta_id
-                    if meta_id and meta_id != session_id:
-                        mismatch = True
-                    entry = self._entry_from_session_meta(item)
-                elif item_type == "response_item":
-                    entry = self._entry_from_response_item(item)
-                elif item_type == "event_msg":
-                    payload = item.get("payload") or {}
-                    variant = payload.get("type")
-                    if variant in {"token_count", "agent_message", "user_message"}:
-                        continue
-                    entry = self._entry_from_event_msg(item)
-                elif item_type == "compacted":
-                    entry = self._entry_from_compacted(item)
-
-                if entry:
-                    entries.append(entry)
-
-            if not entries:
+            if self._peek_session_id(path) != session_id:
                 continue
-
-            if discovered_id == session_id:
+            matched.add(path)
+            entries = self._load_entries(path)
+            if entries:
                 return SessionContext(session_id=session_id, entries=tuple(entries))
 
-            if fallback_context is None:
-                fallback_context = SessionContext(session_id=session_id, entries=tuple(entries))
-                fallback_source = path
-
-        if fallback_context:
-            if fallback_source is not None:
+        for path in candidates:
+            if path in matched:
+                continue
+            entries = self._load_entries(path)
+            if entries:
                 logger.warning(
                     "Session id %s not found; using fallback session from %s",
                     session_id,
-                    fallback_source,
+                    path,
                 )
-            return fallback_context
+                return SessionContext(session_id=session_id, entries=tuple(entries))
 
         raise FileNotFoundError(
             f"Session history for id '{session_id}' not found under {self.history_root}"
         )
 
+    def _peek_session_id(self, path: Path) -> str | None:
+        """Return the id from the rollout's first session_meta record, if any."""
+
+        for index, item in enumerate(self._iter_jsonl(path)):
+            if index >= _META_PEEK_LIMIT:
+                break
+            if item.get("type") != "session_meta":
+                continue
+            meta_id = (item.get("payload") or {}).get("id")
+            if meta_id:
+                return meta_id
+        return None
+
+    def _load_entries(self, path: Path) -> list[HistoryEntry]:
+        entries: list[HistoryEntry] = []
+
+        for item in self._iter_jsonl(path, skip_markers=_SKIPPED_LINE_MARKERS):
+            item_type = item.get("type")
+
+            if item_type == "turn_context":
+                continue
+
+            entry = None
+
+            if item_type == "session_meta":
+                entry = self._entry_from_session_meta(item)
+            elif item_type == "response_item":
+                entry = self._entry_from_response_item(item)
+            elif item_type == "event_msg":
+                payload = item.get("payload") or {}
+                variant = payload.get("type")
+                if variant in {"token_count", "agent_message", "user_message"}:
+                    continue
+                entry = self._entry_from_event_msg(item)
+            elif item_type == "compacted":
+                entry = self._entry_from_compacted(item)
+
+            if entry:
+                entries.append(entry)
+
+        return entries
+
+    def context_version(self, session_id: str) -> object | None:
+        # Reuses the stat results cached on the directory entries while ordering.
+        return files_version(self._candidate_entries(session_id))
+
     def _candidate_paths(self, session_id: str) -> list[Path]:
+        return [Path(candidate) for candidate in self._candidate_entries(session_id)]
+
+    def _candidate_entries(self, session_id: str) -> list[Path | os.DirEntry[str]]:
         root = self.history_root
         if root.is_file():
             return [root]
@@ -96,41 +125,61 @@ class CodexHistoryProvider(SessionHistoryProvider):
                 f"History directory '{root}' does not exist for session '{session_id}'"
             )
 
-        candidates = [p for p in root.rglob("*.jsonl") if p.is_file()]
+        candidates = list(scan_files(root, ".jsonl"))
         if not candidates:
             raise FileNotFoundError(
                 f"No history files found under '{root}' for session '{session_id}'"
             )
 
-        def _mtime_key(path: Path) -> float:
+        def _mtime_key(entry: os.DirEntry[str]) -> float:
             try:
-                return path.stat().st_mtime
+                return entry.stat().st_mtime
             except OSError:
                 return 0.0
 
         matched = sorted(
-            (p for p in candidates if session_id in p.name),
+            (entry for entry in candidates if session_id in entry.name),
             key=_mtime_key,
             reverse=True,
         )
         unmatched = sorted(
-            (p for p in candidates if session_id not in p.name),
+            (entry for entry in candidates if session_id not in entry.name),
             key=_mtime_key,
             reverse=True,
         )
 
-        return matched + unmatched
-
-    def _iter_jsonl(self, path: Path) -> Iterator[dict[str, Any]]:
-        with path.open("r", encoding="utf-8") as handle:
-            for line in handle:
-                text = line.strip()
-                if not text:
-                    continue
-                try:
-                    yield json.loads(text)
-                except json.JSONDecodeError:
+        return [*matched, *unmatched]
+
+    def _iter_jsonl(
+        self, path: Path, skip_markers: tuple[bytes, ...] = ()
+    ) -> Iterator[dict[str, Any]]:
+        # Read raw chunks and split on newlines ourselves; json.loads consumes
+        # the bytes directly, so no per-line text decoding is needed.
+        buffer = bytearray()
+        with path.open("rb", buffering=0) as handle:
+            while chunk := handle.read(_READ_CHUNK_SIZE):
+                scan_from = len(buffer)
+                buffer += chunk
+                end = buffer.rfind(b"\n", scan_from)
+                if end == -1:
                     continue
+                lines = buffer[:end].split(b"\n")
+                del buffer[: end + 1]
+                yield from self._decode_lines(lines, skip_markers)
+        yield from self._decode_lines((buffer,), skip_markers)
+
+    def _decode_lines(
+        self, lines: Iterable[bytes | bytearray], skip_markers: tuple[bytes, ...]
+    ) -> Iterator[dict[str, Any]]:
+        for line in lines:
+            if not line:
+                continue
+            if skip_markers and any(marker in line for marker in skip_markers):
+                continue
+            try:
+                yield loads(line)
+            except ValueError:
+                continue
 
     def _parse_timestamp(self, raw: Any) -> datetime | None:
         if not isinstance(raw, str):
@@ -2,23 +2,123 @@
 
 from __future__ import annotations
 
-import json
+import heapq
 import logging
 import os
+import re
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Iterator, List
+from typing import Any, Iterator, List, Union
 
+from ..jsonutil import loads
 from . import register
-from .base import HistoryEntry, SessionContext, SessionHistoryProvider
+from .base import HistoryEntry, SessionContext, SessionHistoryProvider, files_version, scan_files
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - optional dependency
+    ijson = None
+
+try:
+    import simdjson
+except ImportError:  # pragma: no cover - optional dependency
+    simdjson = None
 
 logger = logging.getLogger(__name__)
 
+# A session file as found on disk: a scandir entry, or a Path for files that
+# were looked up directly.
+_SessionFile = Union[Path, os.DirEntry]
+
+# The newest session file nearly always parses, so the fallback search orders
+# just this many candidates before resorting to a full sort.
+_NEWEST_CANDIDATES = 8
+
+# Session files at least this large are streamed with ijson when it is
+# installed; below it, loading the whole document at once is faster.
+_STREAMING_THRESHOLD = 256 * 1024
+
+# An escaped UTF-16 surrogate without its other half, e.g. a string cut
+# mid-emoji. ijson's C backend turns these into "?", so such files are not
+# streamed.
+_LONE_SURROGATE_ESCAPE = re.compile(
+    rb"\\u[dD][89abAB][0-9a-fA-F]{2}(?!\\u[dD][c-fC-F])"
+    rb"|(?<!\\u[dD][89abAB][0-9a-fA-F]{2})\\u[dD][c-fC-F][0-9a-fA-F]{2}"
+)
+# A match spans at most six bytes and looks up to six bytes behind or ahead.
+_ESCAPE_CONTEXT = 6
+_SCAN_CHUNK_SIZE = 1024 * 1024
+
+
+def _mtime(path: _SessionFile) -> float:
+    # os.DirEntry caches its stat result, so repeated calls cost no syscall.
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+def _newest_first(paths: List[_SessionFile]) -> Iterator[_SessionFile]:
+    """Yield ``paths`` newest first, only fully sorting them if the newest few are exhausted."""
+
+    keyed = [(_mtime(path), index) for index, path in enumerate(paths)]
+    newest = heapq.nlargest(_NEWEST_CANDIDATES, keyed)
+    for _, index in newest:
+        yield paths[index]
+    if len(keyed) > len(newest):
+        seen = {index for _, index in newest}
+        rest = sorted((item for item in keyed if item[1] not in seen), reverse=True)
+        for _, index in rest:
+            yield paths[index]
+
+
+def _has_lone_surrogate_escape(path: Path) -> bool:
+    # Read in chunks rather than through mmap: VS Code keeps rewriting the
+    # active session file, and truncating a mapped file raises SIGBUS.
+    search = _LONE_SURROGATE_ESCAPE.search
+    buffer = b""
+    start = 0
+    with path.open("rb") as f:
+        while True:
+            chunk = f.read(_SCAN_CHUNK_SIZE)
+            buffer += chunk
+            # Matches starting before ``limit`` can see all the bytes they look
+            # ahead at; later ones are decided once the next chunk is in.
+            limit = len(buffer) if not chunk else len(buffer) - 2 * _ESCAPE_CONTEXT
+            if limit > start:
+                match = search(buffer, start)
+                if match is not None and match.start() < limit:
+                    return True
+                keep = max(limit - _ESCAPE_CONTEXT, 0)
+                buffer = buffer[keep:]
+                start = limit - keep
+            if not chunk:
+                return False
+
+
+def _materialize(value: Any) -> Any:
+    """Convert simdjson document proxies into plain Python containers."""
+
+    if hasattr(value, "as_dict"):
+        return value.as_dict()
+    if hasattr(value, "as_list"):
+        return value.as_list()
+    return value
+
 
 @register("copilot")
 class CopilotHistoryProvider(SessionHistoryProvider):
     """Reads GitHub Copilot Chat history from VS Code workspace storage."""
 
+    #: Seconds before the VS Code storage locations are looked up again.
+    storage_bases_ttl: float = 60.0
+
+    def __init__(self, history_root: Path):
+        super().__init__(history_root)
+        self._bases: tuple[Path, ...] | None = None
+        self._bases_checked_at = 0.0
+
     def load_context(self, session_id: str) -> SessionContext:
         """
         Load the session context.
@@ -28,7 +128,7 @@ class CopilotHistoryProvider(SessionHistoryProvider):
         all discovered workspaces.
         """
         # 1. Find all potential session files
-        candidates = self._find_session_files(session_id)
+        candidates = self._find_session_entries(session_id)
         
         if not candidates:
              raise FileNotFoundError(
@@ -41,18 +141,18 @@ class CopilotHistoryProvider(SessionHistoryProvider):
         #    However, since we want to support "current session" implicitly, we'll just
         #    look at all of them and pick the newest one if we can't find an exact match.
         
-        # Check for exact match first
+        # Check for exact match first (_find_session_files already returns just
+        # the exact file when it sits in a standard location)
         if session_id:
             exact_matches = [p for p in candidates if p.name == f"{session_id}.json"]
             if exact_matches:
-                return self._load_file(exact_matches[0], session_id)
+                return self._load_file(Path(exact_matches[0]), session_id)
 
-        # Fallback: Sort by mtime and try to load the newest valid one
-        candidates.sort(key=lambda p: p.stat().st_mtime, reverse=True)
-        
+        # Fallback: try to load the newest valid one
         logger.info(f"Found {len(candidates)} candidate chat sessions. Checking for most recent valid one...")
 
-        for path in candidates:
+        for entry in _newest_first(candidates):
+            path = Path(entry)
             try:
                 # Use the filename as the session_id for the context
                 actual_session_id = path.stem
@@ -68,6 +168,9 @@ class CopilotHistoryProvider(SessionHistoryProvider):
             f"Could not parse any valid history from {len(candidates)} candidates."
         )
 
+    def context_version(self, session_id: str) -> object | None:
+        return files_version(self._find_session_entries(session_id))
+
     def _load_file(self, path: Path, session_id: str) -> SessionContext:
         entries = self._parse_history_file(path)
         if entries:
@@ -76,58 +179,146 @@ class CopilotHistoryProvider(SessionHistoryProvider):
 
     def _find_session_files(self, session_id: str) -> List[Path]:
         """Find all potential history files."""
-        
+
+        return [Path(entry) for entry in self._find_session_entries(session_id)]
+
+    def _find_session_entries(self, session_id: str) -> List[_SessionFile]:
+        """Find all potential history files, keeping the scandir entries.
+
+        ``os.DirEntry`` objects carry their stat result, so ordering the
+        candidates and fingerprinting them does not stat each file again.
+        """
+
+        if self.history_root.is_file():
+            return [self.history_root]
+
+        # A session id that names a file can be looked up directly with one stat
+        # per location instead of listing every chatSessions directory.
+        if session_id and Path(session_id).name == session_id:
+            exact = self._find_exact_session_file(f"{session_id}.json")
+            if exact is not None:
+                return [exact]
+
         candidates = []
         
         # If history_root is explicitly set
         if self.history_root.exists():
-             if self.history_root.is_file():
-                 return [self.history_root]
-             # Check recursively for any json files in chatSessions
-             candidates.extend(self.history_root.rglob("chatSessions/*.json"))
-             # Also check directly if history_root IS a chatSessions dir or contains json files
-             candidates.extend(self.history_root.glob("*.json"))
-
-        # Search in standard VS Code locations
-        base_paths = [
-            Path(os.path.expanduser("~/Library/Application Support/Code/User/workspaceStorage")),
-            Path(os.path.expanduser("~/Library/Application Support/Code - Insiders/User/workspaceStorage"))
-        ]
-
-        for base in base_paths:
-            if not base.exists():
+             # Check recursively for any json files in chatSessions, and directly
+             # in case history_root IS a chatSessions dir or contains json files
+             root = os.fspath(self.history_root)
+             for entry in scan_files(root, ".json"):
+                 parent = os.path.dirname(entry.path)
+                 if parent == root or os.path.basename(parent) == "chatSessions":
+                     candidates.append(entry)
+
+        # Search in standard VS Code locations.
+        # We want ALL chat sessions to enable "most recent" fallback
+        # This might be expensive if there are thousands of workspaces, 
+        # but typically chatSessions are sparse.
+        # Using rglob("chatSessions/*.json") is cleaner but might traverse too much.
+        # Let's iterate workspaces one level deep.
+        for workspace_dir in self._workspace_dirs():
+            try:
+                with os.scandir(os.path.join(workspace_dir, "chatSessions")) as sessions:
+                    candidates.extend(
+                        entry
+                        for entry in sessions
+                        if entry.name.endswith(".json") and entry.is_file()
+                    )
+            except (FileNotFoundError, NotADirectoryError):
                 continue
-            
-            # We want ALL chat sessions to enable "most recent" fallback
-            # This might be expensive if there are thousands of workspaces, 
-            # but typically chatSessions are sparse.
-            # Using rglob("chatSessions/*.json") is cleaner but might traverse too much.
-            # Let's iterate workspaces one level deep.
-            logger.debug(f"Scanning for chat sessions in: {base}")
-            for workspace_dir in base.iterdir():
-                if not workspace_dir.is_dir():
-                    continue
-                
-                chat_dir = workspace_dir / "chatSessions"
-                if chat_dir.exists():
-                    candidates.extend(chat_dir.glob("*.json"))
         
         # Deduplicate paths
-        unique_candidates = list(set(candidates))
+        unique_candidates = list({entry.path: entry for entry in candidates}.values())
         logger.debug(f"Found {len(unique_candidates)} unique chat session files.")
         return unique_candidates
 
+    def _find_exact_session_file(self, file_name: str) -> Path | None:
+        """Return the first session file named ``file_name`` in the known locations."""
+
+        root = self.history_root
+        for path in (root / file_name, root / "chatSessions" / file_name):
+            if path.is_file():
+                return path
+        # history_root is usually a workspaceStorage directory itself.
+        try:
+            with os.scandir(root) as workspaces:
+                root_workspaces = [entry.path for entry in workspaces if entry.is_dir()]
+        except (FileNotFoundError, NotADirectoryError):
+            root_workspaces = []
+        for workspace_dir in [*root_workspaces, *self._workspace_dirs()]:
+            path = os.path.join(workspace_dir, "chatSessions", file_name)
+            if os.path.isfile(path):
+                return Path(path)
+        return None
+
+    def _storage_bases(self) -> tuple[Path, ...]:
+        """Return the existing standard VS Code workspace storage locations.
+
+        The result is reused for ``storage_bases_ttl`` seconds since install
+        locations rarely change while the server runs.
+        """
+
+        now = time.monotonic()
+        if self._bases is None or now - self._bases_checked_at > self.storage_bases_ttl:
+            base_paths = [
+                Path(os.path.expanduser("~/Library/Application Support/Code/User/workspaceStorage")),
+                Path(os.path.expanduser("~/Library/Application Support/Code - Insiders/User/workspaceStorage"))
+            ]
+            self._bases = tuple(base for base in base_paths if base.is_dir())
+            self._bases_checked_at = now
+        return self._bases
+
+    def _workspace_dirs(self) -> List[str]:
+        """Return the workspace directories under the standard VS Code storage locations."""
+
+        workspace_dirs: List[str] = []
+        for base in self._storage_bases():
+            logger.debug(f"Scanning for chat sessions in: {base}")
+            try:
+                with os.scandir(base) as workspaces:
+                    workspace_dirs.extend(entry.path for entry in workspaces if entry.is_dir())
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+        return workspace_dirs
+
+    def _iter_requests(self, path: Path) -> Iterator[Any]:
+        """Yield the items of the session's root "requests" array."""
+
+        if (
+            ijson is not None
+            and path.stat().st_size >= _STREAMING_THRESHOLD
+            and not _has_lone_surrogate_escape(path)
+        ):
+            # Stream large sessions one request at a time instead of holding
+            # the whole document in memory.
+            with path.open("rb") as f:
+                yield from ijson.items(f, "requests.item", use_float=True)
+            return
+
+        raw = path.read_bytes()
+        # simdjson only builds Python objects for the fields we touch, which
+        # skips the large blobs (file contents, tool output) in session files.
+        # A fresh parser per file keeps concurrent tool calls independent.
+        data = None
+        if simdjson is not None:
+            try:
+                data = simdjson.Parser().parse(raw)
+            except ValueError:
+                # simdjson rejects escaped lone surrogates ("\ud83d") that VS
+                # Code writes when a string is cut mid-emoji; loads() takes them.
+                data = None
+        if data is None:
+            data = loads(raw)
+
+        # The root object has a "requests" array
+        yield from data.get("requests", [])
+
     def _parse_history_file(self, path: Path) -> List[HistoryEntry]:
         """Parse a Copilot chat session JSON file."""
-        with path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
-
         entries: List[HistoryEntry] = []
         
-        # The root object has a "requests" array
-        requests = data.get("requests", [])
-        
-        for req in requests:
+        for req in self._iter_requests(path):
             # User query
             timestamp_ms = req.get("timestamp")
             timestamp = datetime.fromtimestamp(timestamp_ms / 1000.0) if timestamp_ms else None
@@ -147,7 +338,7 @@ class CopilotHistoryProvider(SessionHistoryProvider):
             # Assistant response
             response = req.get("response", [])
             for resp_item in response:
-                resp_value = resp_item.get("value", "")
+                resp_value = _materialize(resp_item.get("value", ""))
                 if resp_value:
                      entries.append(HistoryEntry(
                         timestamp=timestamp, # Response usually shares roughly the same time
@@ -161,7 +352,7 @@ class CopilotHistoryProvider(SessionHistoryProvider):
                     tool_id = resp_item.get("toolId")
                     tool_call_id = resp_item.get("toolCallId")
                     result_details = resp_item.get("resultDetails", {})
-                    input_args = result_details.get("input")
+                    input_args = _materialize(result_details.get("input"))
                     
                     # Create a readable text representation for searchability
                     text_repr = f"Tool Call: {tool_id}\nArguments: {input_args}"
@@ -176,7 +367,7 @@ class CopilotHistoryProvider(SessionHistoryProvider):
                             "toolCallId": tool_call_id,
                             "toolId": tool_id,
                             "input": input_args,
-                            "output": result_details.get("output")
+                            "output": _materialize(result_details.get("output"))
                         }
                     ))
         
@@ -0,0 +1,34 @@
+"""JSON helpers that use orjson when it is installed."""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# ``loads`` accepts ``bytes``, ``bytearray`` or ``str`` and raises ``ValueError``
+# (a ``json.JSONDecodeError``) on malformed input with either backend.
+if orjson is not None:
+
+    def loads(data: bytes | bytearray | str) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects escaped lone surrogates ("\ud83d"), which VS Code
+            # writes when a string is cut mid-emoji; the stdlib accepts them.
+            return json.loads(data)
+
+else:  # pragma: no cover - optional dependency
+    loads = json.loads
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize ``value`` to compact UTF-8 encoded JSON."""
+
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")  # pragma: no cover
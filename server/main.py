@@ -13,6 +13,8 @@ from fastmcp import Context, FastMCP
 
 from .config import ServerConfig, load_config
 from .frameworks import get_history_provider
+from .frameworks.base import SessionContext
+from .patterns import compile_regex
 from .session_state import SessionNoteTracker
 from .storage import StickyNote, StickyNoteStore
 
@@ -21,13 +23,6 @@ SERVER_NAME = "Sticky Note MCP Server"
 logger = logging.getLogger(__name__)
 
 
-def _compile_regex(pattern: str) -> re.Pattern[str]:
-    try:
-        return re.compile(pattern, re.MULTILINE)
-    except re.error as exc:  # pragma: no cover - validation guard
-        raise ValueError(f"Invalid regular expression: {exc}") from exc
-
-
 def _timestamp_now() -> datetime:
     return datetime.now(timezone.utc)
 
@@ -40,27 +35,53 @@ def _entry_metadata(entry) -> Dict[str, Any]:
     }
 
 
-def _collect_snippets(pattern: re.Pattern[str], context) -> List[Dict[str, Any]]:
-    snippets: list[Dict[str, Any]] = []
-    for entry in context.entries:
-        if not entry.text:
+def _collect_snippets(
+    pattern: re.Pattern[str], context, with_metadata: bool = True
+) -> List[Dict[str, Any]] | List[str]:
+    """Return a window of text around every match of ``pattern`` in ``context``.
+
+    Each snippet is a ``{"text", "metadata"}`` dict, or just the text when
+    ``with_metadata`` is false, which skips building the metadata entirely.
+    """
+
+    # Run the regex over every entry first, then cut all windows in one pass.
+    # Hot names are bound to locals to skip repeated global/attribute lookups.
+    texts = context.texts
+    search = pattern.search
+    finditer = pattern.finditer
+    extract_window = _extract_window
+
+    spans: list[tuple[int, int, int]] = []
+    for index, text in enumerate(texts):
+        # finditer always runs on ``re``; checking with search first keeps
+        # entries the regex cannot match away from backtracking (RE2 answers
+        # search in linear time when it is installed).
+        if not text or not search(text):
             continue
-        for match in pattern.finditer(entry.text):
-            span = match.span()
-            snippet_text = _extract_window(entry.text, span)
-            snippets.append({
-                "text": snippet_text,
-                "metadata": _entry_metadata(entry),
-            })
+        spans.extend((index, *match.span()) for match in finditer(text))
+
+    if not with_metadata:
+        return [extract_window(texts[index], (start, end)) for index, start, end in spans]
+
+    entries = context.entries
+    entry_metadata = _entry_metadata
+    snippets: list[Dict[str, Any]] = []
+    append = snippets.append
+    for index, start, end in spans:
+        append({
+            "text": extract_window(texts[index], (start, end)),
+            "metadata": entry_metadata(entries[index]),
+        })
     return snippets
 
 
 def _extract_window(text: str, span: tuple[int, int], padding: int = 80) -> str:
     start, end = span
+    length = len(text)
     window_start = max(0, start - padding)
-    window_end = min(len(text), end + padding)
+    window_end = min(length, end + padding)
     prefix = "…" if window_start > 0 else ""
-    suffix = "…" if window_end < len(text) else ""
+    suffix = "…" if window_end < length else ""
     return f"{prefix}{text[window_start:window_end]}{suffix}"
 
 
@@ -101,13 +122,12 @@ def build_app(config: Optional[ServerConfig] = None) -> FastMCP:
         if not message:
             raise ValueError("Sticky note message cannot be empty")
 
-        pattern = _compile_regex(context_regex)
+        pattern = compile_regex(context_regex)
         try:
-            context = history_provider.load_context(session_id)
+            context = history_provider.cached_context(session_id)
         except FileNotFoundError as exc:
             raise RuntimeError(f"No session history found for session_id '{session_id}'") from exc
-        snippets = _collect_snippets(pattern, context)
-        snippet_texts = [snippet["text"] for snippet in snippets]
+        snippet_texts = _collect_snippets(pattern, context, with_metadata=False)
 
         generated_id = note_id or uuid4().hex
         note = StickyNote(
@@ -119,7 +139,7 @@ def build_app(config: Optional[ServerConfig] = None) -> FastMCP:
         )
         notes_store.append(note)
 
-        logger.debug("Created sticky note %s with %d snippets", note.id, len(snippets))
+        logger.debug("Created sticky note %s with %d snippets", note.id, len(snippet_texts))
 
         return {
             "id": note.id,
@@ -136,29 +156,27 @@ def build_app(config: Optional[ServerConfig] = None) -> FastMCP:
             raise RuntimeError("FastMCP session_id is required for reading sticky notes")
 
         try:
-            context = history_provider.load_context(session_id)
+            context = history_provider.cached_context(session_id)
         except FileNotFoundError as exc:
             raise RuntimeError(f"No session history found for session_id '{session_id}'") from exc
         results: list[dict[str, Any]] = []
 
-        for note in notes_store.all_notes():
-            if note_tracker.has_shown(session_id, note.id):
-                continue
-
-            try:
-                pattern = _compile_regex(note.context_regex)
-            except ValueError as exc:
-                logger.warning("Skipping note %s due to invalid regex: %s", note.id, exc)
+        shown = note_tracker.shown(session_id)
+        # One pass over the entries matches all stored patterns at once; each
+        # note's snippets are then cut only from the entries it matched.
+        entries = context.entries
+        for note, indexes in notes_store.match(context.texts):
+            if note.id in shown:
                 continue
 
-            snippets = _collect_snippets(pattern, context)
-            if not snippets:
-                continue
+            hits = tuple(entries[index] for index in indexes)
+            snippet_context = SessionContext(session_id=context.session_id, entries=hits)
+            snippet_texts = _collect_snippets(note.pattern, snippet_context, with_metadata=False)
 
             note_tracker.mark_shown(session_id, note.id)
             payload = {
                 "message": note.message,
-                "trigger_snippets": [snippet["text"] for snippet in snippets],
+                "trigger_snippets": snippet_texts,
             }
             results.append(payload)
 
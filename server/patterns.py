@@ -0,0 +1,317 @@
+"""Regular expression compilation for sticky note context patterns."""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, Match, Pattern, Sequence
+
+try:
+    import re2
+except ImportError:  # pragma: no cover - optional dependency
+    re2 = None
+
+try:
+    import hyperscan
+except ImportError:  # pragma: no cover - optional dependency
+    hyperscan = None
+
+# Flags RE2 understands with the same meaning as ``re`` (passed as inline flags).
+_RE2_FLAGS = {re.IGNORECASE: "i", re.MULTILINE: "m", re.DOTALL: "s"}
+_RE2_COMPATIBLE_FLAGS = re.UNICODE | re.IGNORECASE | re.MULTILINE | re.DOTALL
+# Constructs that RE2 and Hyperscan accept but interpret differently from
+# ``re``: their shorthand classes differ (RE2's are ASCII-only, Hyperscan's
+# "\s" lacks "\x1c"-"\x1f"), they read "{,n}" literally and they support POSIX
+# classes ("[[:alpha:]]") that ``re`` reads as a plain set.
+_DIVERGENT_SYNTAX = re.compile(r"\\[dDwWsSbB]|\{,|\[\[:")
+# RE2's and Hyperscan's case folding leave out the Turkish dotted and dotless i
+# ("İ", "ı"), which re matches against i/I; classes and code point escapes can
+# cover them too.
+_CASELESS_DIVERGENT = re.compile(r"[iI\u0130\u0131\[]|\\[xuUN0-7]")
+# Inline groups that turn on case folding for part of a pattern ("(?i:...)"),
+# which leave IGNORECASE out of the compiled flags.
+_SCOPED_CASELESS = re.compile(r"\(\?[a-zA-Z-]*i[a-zA-Z-]*[:)]")
+# Inline flag groups, whose letters are not matched against the text. An
+# escaped "\(" is left alone so the check stays on the cautious side.
+_FLAG_GROUP = re.compile(r"(?<!\\)\(\?[a-zA-Z-]+[:)]")
+_RE2_MAX_MEM = 8 << 20
+# Prefilter mode lets Hyperscan accept constructs it cannot match exactly (such
+# as backreferences) by approximating them with a superset.
+_HS_FLAGS = (
+    (
+        hyperscan.HS_FLAG_PREFILTER
+        | hyperscan.HS_FLAG_SINGLEMATCH
+        | hyperscan.HS_FLAG_UTF8
+        | hyperscan.HS_FLAG_UCP
+        | hyperscan.HS_FLAG_MULTILINE
+    )
+    if hyperscan is not None
+    else 0
+)
+_HS_COMPATIBLE_FLAGS = re.UNICODE | re.IGNORECASE | re.MULTILINE | re.DOTALL
+# Whether Hyperscan compiles an expression on its own, by (expression, flags).
+# Kept across pattern sets so one rejected note regex does not cost a compile
+# per pattern every time the notes change.
+_HS_ACCEPTED: dict[tuple[bytes, int], bool] = {}
+_HS_ACCEPTED_MAX = 4096
+# Patterns with other flags (set inline) cannot share one alternation.
+_COMBINABLE_FLAGS = re.UNICODE | re.MULTILINE
+# Backreferences and conditionals refer to groups by position, which shifts once
+# patterns are joined into one alternation.
+_GROUP_REFERENCE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+
+def _is_caseless(compiled: Pattern[str]) -> bool:
+    """Whether any part of ``compiled`` matches ignoring case."""
+
+    return bool(compiled.flags & re.IGNORECASE) or _SCOPED_CASELESS.search(compiled.pattern) is not None
+
+
+def _folds_case_differently(compiled: Pattern[str]) -> bool:
+    """Whether RE2 or Hyperscan may fold case differently from ``re`` for ``compiled``."""
+
+    if not _is_caseless(compiled):
+        return False
+    return _CASELESS_DIVERGENT.search(_FLAG_GROUP.sub("", compiled.pattern)) is not None
+
+
+def _to_re2(compiled: Pattern[str], flags: int) -> Pattern[str] | None:
+    """Return an RE2 equivalent of ``compiled`` or ``None`` if there is none."""
+
+    if re2 is None:
+        return None
+    if compiled.flags & ~_RE2_COMPATIBLE_FLAGS or _DIVERGENT_SYNTAX.search(compiled.pattern):
+        return None
+    if not compiled.flags & re.MULTILINE and "$" in compiled.pattern:
+        # Without MULTILINE, re's "$" also matches before a trailing newline.
+        return None
+    if _folds_case_differently(compiled):
+        return None
+
+    inline = "".join(letter for flag, letter in _RE2_FLAGS.items() if flags & flag)
+    source = f"(?{inline}){compiled.pattern}" if inline else compiled.pattern
+    options = re2.Options()
+    options.max_mem = _RE2_MAX_MEM
+    options.log_errors = False
+    try:
+        return _RE2Pattern(re2.compile(source, options=options), compiled)
+    except re2.error:
+        # Backreferences, lookarounds and similar are only supported by ``re``.
+        return None
+
+
+class _RE2Pattern:
+    """An RE2 pattern whose ``search`` falls back to ``re`` for text RE2 cannot take.
+
+    RE2 matches on UTF-8, so text holding lone surrogates (which JSON decoding
+    can produce) raises ``UnicodeEncodeError``; ``re`` matches it as usual.
+    Only ``search`` uses RE2: its ``finditer`` steps over empty matches
+    differently from ``re``. ``pattern`` and ``flags`` are those of the ``re``
+    pattern, and any other attribute, ``finditer`` included, is served by it.
+    """
+
+    __slots__ = ("_fast", "_compiled", "pattern", "flags")
+
+    def __init__(self, fast: Any, compiled: Pattern[str]):
+        self._fast = fast
+        self._compiled = compiled
+        self.pattern = compiled.pattern
+        self.flags = compiled.flags
+
+    def search(self, string: str, *args: int) -> Match[str] | None:
+        try:
+            return self._fast.search(string, *args)
+        except UnicodeEncodeError:
+            return self._compiled.search(string, *args)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._compiled, name)
+
+    def __repr__(self) -> str:
+        return f"<RE2 pattern {self.pattern!r}>"
+
+
+@lru_cache(maxsize=4096)
+def compile_regex(pattern: str, flags: int = re.MULTILINE) -> Pattern[str]:
+    """Compile ``pattern``, using RE2 for linear-time matching when it is installed.
+
+    Patterns are always validated with ``re`` so the accepted syntax does not
+    depend on RE2 being present; those RE2 rejects or would interpret
+    differently keep the ``re`` implementation. Raises ``ValueError`` for
+    invalid patterns.
+    """
+
+    return _compile(pattern, flags)
+
+
+def _compile(pattern: str, flags: int) -> Pattern[str]:
+    try:
+        compiled = re.compile(pattern, flags)
+    except re.error as exc:
+        raise ValueError(f"Invalid regular expression: {exc}") from exc
+    return _to_re2(compiled, flags) or compiled
+
+
+def combine_patterns(patterns: Iterable[Pattern[str]]) -> Pattern[str] | None:
+    """Return one alternation that matches wherever any of ``patterns`` matches.
+
+    ``patterns`` are compiled with :func:`compile_regex`'s default flags.
+    Returns ``None`` for fewer than two distinct patterns, when they cannot be
+    joined without changing their meaning (flags beyond MULTILINE, group
+    references) or when the joined pattern fails to compile, e.g. because of
+    duplicate group names or its size. The result is not cached.
+    """
+
+    sources: dict[str, None] = {}
+    for pattern in patterns:
+        if pattern.flags & ~_COMBINABLE_FLAGS or _GROUP_REFERENCE.search(pattern.pattern):
+            return None
+        sources[pattern.pattern] = None
+    if len(sources) < 2:
+        return None
+    try:
+        return _compile("|".join(f"(?:{source})" for source in sources), re.MULTILINE)
+    except (ValueError, OverflowError, RecursionError):
+        return None
+
+
+def _hs_source(pattern: Pattern[str]) -> tuple[bytes, int] | None:
+    """Return the Hyperscan expression and flags for ``pattern``, if it has any."""
+
+    flags = pattern.flags
+    if flags & ~_HS_COMPATIBLE_FLAGS or _DIVERGENT_SYNTAX.search(pattern.pattern):
+        return None
+    if _is_caseless(pattern):
+        # Hyperscan's caseless tables also disagree with re outside ASCII
+        # ("ა"/"Ა", "ʂ"/"Ʂ").
+        if not pattern.pattern.isascii() or _folds_case_differently(pattern):
+            return None
+    hs_flags = _HS_FLAGS
+    if flags & re.IGNORECASE:
+        hs_flags |= hyperscan.HS_FLAG_CASELESS
+    if flags & re.DOTALL:
+        hs_flags |= hyperscan.HS_FLAG_DOTALL
+    try:
+        return pattern.pattern.encode("utf-8"), hs_flags
+    except UnicodeEncodeError:
+        return None
+
+
+def _hs_compile(sources: list[tuple[bytes, int]]):
+    database = hyperscan.Database()
+    database.compile(
+        expressions=[expression for expression, _ in sources],
+        ids=list(range(len(sources))),
+        elements=len(sources),
+        flags=[flags for _, flags in sources],
+    )
+    return database
+
+
+def _hs_accepts(source: tuple[bytes, int]) -> bool:
+    accepted = _HS_ACCEPTED.get(source)
+    if accepted is None:
+        try:
+            _hs_compile([source])
+        except hyperscan.error:
+            accepted = False
+        else:
+            accepted = True
+        _remember_hs_acceptance([source], accepted)
+    return accepted
+
+
+def _remember_hs_acceptance(sources: Iterable[tuple[bytes, int]], accepted: bool) -> None:
+    if len(_HS_ACCEPTED) >= _HS_ACCEPTED_MAX:
+        _HS_ACCEPTED.clear()
+    for source in sources:
+        _HS_ACCEPTED[source] = accepted
+
+
+class PatternSet:
+    """Match one text against many patterns compiled by :func:`compile_regex`.
+
+    With Hyperscan installed, every pattern it reads the same way as ``re`` goes
+    into a single database, so one scan over the text picks the candidates; each
+    candidate is then confirmed with its own compiled pattern. The remaining
+    patterns are searched with ``re``; when :func:`combine_patterns` can join
+    them into one alternation, text it does not match skips them all.
+    """
+
+    def __init__(self, patterns: Sequence[Pattern[str]]):
+        self._patterns = tuple(patterns)
+        self._database = None
+        self._hs_indexes: tuple[int, ...] = ()
+        self._unscanned: tuple[int, ...] = tuple(range(len(self._patterns)))
+        if hyperscan is not None and self._patterns:
+            self._build_database()
+        self._rest = combine_patterns(self._patterns[index] for index in self._unscanned)
+
+    def _build_database(self) -> None:
+        sources = {}
+        for index, pattern in enumerate(self._patterns):
+            source = _hs_source(pattern)
+            if source is not None and _HS_ACCEPTED.get(source, True):
+                sources[index] = source
+        if not sources:
+            return
+        try:
+            database = _hs_compile(list(sources.values()))
+        except hyperscan.error:
+            # Find the patterns Hyperscan rejects one by one and leave them to ``re``.
+            sources = {index: source for index, source in sources.items() if _hs_accepts(source)}
+            if not sources:
+                return
+            try:
+                database = _hs_compile(list(sources.values()))
+            except hyperscan.error:
+                # The patterns compile on their own but not together (for
+                # example past a size limit); search them all with ``re``.
+                return
+        else:
+            _remember_hs_acceptance(sources.values(), True)
+        self._database = database
+        self._hs_indexes = tuple(sources)
+        self._unscanned = tuple(index for index in range(len(self._patterns)) if index not in sources)
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def search(self, text: str) -> Iterator[int]:
+        """Yield, in order, the index of every pattern that matches ``text``."""
+
+        patterns = self._patterns
+        try:
+            hits = self._scan(text)
+        except UnicodeEncodeError:
+            candidates: Iterable[int] = range(len(patterns))
+        else:
+            unscanned = self._unscanned
+            if self._rest is not None and self._rest.search(text) is None:
+                unscanned = ()
+            candidates = sorted(hits.union(unscanned))
+        for index in candidates:
+            if patterns[index].search(text):
+                yield index
+
+    def _scan(self, text: str) -> set[int]:
+        """Return the Hyperscan candidates among the scanned patterns.
+
+        Raises ``UnicodeEncodeError`` for text with lone surrogates, which is
+        not valid UTF-8 input for Hyperscan.
+        """
+
+        hits: set[int] = set()
+        if self._database is None:
+            return hits
+        # Unlike ``re``, Hyperscan's multiline "^" never matches after a
+        # trailing newline; scanning one more newline keeps the candidates a
+        # superset of the real matches.
+        data = text.encode("utf-8") + b"\n"
+        hs_indexes = self._hs_indexes
+
+        def on_match(match_id, start, end, flags, context):
+            hits.add(hs_indexes[match_id])
+
+        self._database.scan(data, match_event_handler=on_match)
+        return hits
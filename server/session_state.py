@@ -2,8 +2,11 @@
 
 from __future__ import annotations
 
+import sys
 from collections import defaultdict
-from typing import DefaultDict, Iterable, Set
+from typing import AbstractSet, DefaultDict, Iterable, Set
+
+_EMPTY: frozenset[str] = frozenset()
 
 
 class SessionNoteTracker:
@@ -13,13 +16,24 @@ class SessionNoteTracker:
         self._shown: DefaultDict[str, Set[str]] = defaultdict(set)
 
     def mark_shown(self, session_id: str, note_id: str) -> None:
-        self._shown[session_id].add(note_id)
+        # Interned ids are shared with the store's notes (see StickyNote.from_dict)
+        # and across sessions, so each set entry costs only its slot.
+        self._shown[session_id].add(sys.intern(note_id))
 
     def has_shown(self, session_id: str, note_id: str) -> bool:
-        return note_id in self._shown.get(session_id, set())
+        shown = self._shown.get(session_id)
+        return shown is not None and note_id in shown
+
+    def shown(self, session_id: str) -> AbstractSet[str]:
+        """Return the note ids already shown in ``session_id``.
+
+        This is the tracker's own set, not a copy, so callers must not modify it.
+        """
+
+        return self._shown.get(session_id, _EMPTY)
 
     def unseen(self, session_id: str, note_ids: Iterable[str]) -> list[str]:
-        seen = self._shown.get(session_id, set())
+        seen = self.shown(session_id)
         return [note_id for note_id in note_ids if note_id not in seen]
 
     def reset(self, session_id: str) -> None:
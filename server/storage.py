@@ -2,26 +2,61 @@
 
 from __future__ import annotations
 
-import json
-from dataclasses import dataclass
+import logging
+import os
+import stat as stat_module
+import sys
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, Iterator
+from typing import BinaryIO, Iterable, Iterator, Pattern, Sequence
+
+from .jsonutil import dumps, loads
+from .patterns import PatternSet, compile_regex
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
 
 ISO_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+_WRITE_BUFFER_SIZE = 64 * 1024
+# Stores at least this large are read in chunks instead of a single read().
+_CHUNKED_READ_THRESHOLD = 4 * 1024 * 1024
+_READ_CHUNK_SIZE = 1024 * 1024
+# Stores holding more than this many notes per live id are compacted on open.
+_COMPACTION_RATIO = 2
+_UTC = timezone.utc
+
+logger = logging.getLogger(__name__)
 
 
 def _dt_to_iso(value: datetime) -> str:
     if value.tzinfo is None:
-        value = value.replace(tzinfo=timezone.utc)
-    else:
-        value = value.astimezone(timezone.utc)
+        value = value.replace(tzinfo=_UTC)
+    elif value.tzinfo is not _UTC:
+        value = value.astimezone(_UTC)
     return value.isoformat().replace("+00:00", "Z")
 
 
+# Datetimes are immutable, so parsed values can be shared. Every note is parsed
+# again whenever the notes file changes, which makes repeats the common case.
+@lru_cache(maxsize=4096)
 def _iso_to_dt(value: str) -> datetime:
-    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
-    return dt.astimezone(timezone.utc)
+    try:
+        # Python 3.11+ parses the trailing "Z" directly and returns the UTC singleton.
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo is _UTC else dt.astimezone(_UTC)
 
 
 @dataclass(slots=True)
@@ -34,27 +69,63 @@ class StickyNote:
     created_at: datetime
     creator: str | None = None
     trigger_snippets: list[str] | None = None
+    _pattern: Pattern[str] | None = field(default=None, init=False, repr=False, compare=False)
+    _pattern_error: str | None = field(default=None, init=False, repr=False, compare=False)
+    _jsonl: bytes | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def pattern(self) -> Pattern[str]:
+        """Return the compiled ``context_regex``, compiling it on first access.
+
+        Raises ``ValueError`` for an invalid regex; the failure is remembered so
+        the pattern is not recompiled on every lookup.
+        """
+
+        if self._pattern is None:
+            if self._pattern_error is None:
+                try:
+                    self._pattern = compile_regex(self.context_regex)
+                except ValueError as exc:
+                    self._pattern_error = str(exc)
+            if self._pattern_error is not None:
+                raise ValueError(self._pattern_error)
+        return self._pattern
 
     def to_dict(self) -> dict[str, object]:
-        return {
+        payload: dict[str, object] = {
             "id": self.id,
             "message": self.message,
             "context_regex": self.context_regex,
             "created_at": _dt_to_iso(self.created_at),
-            **({"creator": self.creator} if self.creator else {}),
-            **({"trigger_snippets": self.trigger_snippets} if self.trigger_snippets else {}),
         }
+        if self.creator:
+            payload["creator"] = self.creator
+        if self.trigger_snippets:
+            payload["trigger_snippets"] = self.trigger_snippets
+        return payload
+
+    def as_jsonl_bytes(self) -> bytes:
+        """Return the note serialized as one JSONL line, computing it only once.
+
+        Notes are not modified after creation, so the cached line stays valid.
+        """
+
+        if self._jsonl is None:
+            self._jsonl = dumps(self.to_dict()) + b"\n"
+        return self._jsonl
 
     @classmethod
     def from_dict(cls, payload: dict[str, object]) -> "StickyNote":
         raw_snippets = payload.get("trigger_snippets")
-        trigger_snippets = (
-            [str(item) for item in raw_snippets]
-            if isinstance(raw_snippets, list)
-            else None
-        )
+        if not isinstance(raw_snippets, list):
+            trigger_snippets = None
+        elif all(type(item) is str for item in raw_snippets):
+            # Stored notes always hold strings; reuse the decoded list as is.
+            trigger_snippets = raw_snippets
+        else:
+            trigger_snippets = [str(item) for item in raw_snippets]
         return cls(
-            id=str(payload["id"]),
+            id=sys.intern(str(payload["id"])),
             message=str(payload["message"]),
             context_regex=str(payload["context_regex"]),
             created_at=_iso_to_dt(str(payload["created_at"])),
@@ -63,6 +134,175 @@ class StickyNote:
         )
 
 
+if msgspec is not None:
+
+    class _NoteRecord(msgspec.Struct):
+        """The stored fields of a note, as decoded by msgspec.
+
+        Decoding into StickyNote itself would also fill its private cache
+        slots from whatever keys a line carries.
+        """
+
+        id: str
+        message: str
+        context_regex: str
+        created_at: datetime
+        creator: str | None = None
+        trigger_snippets: list[str] | None = None
+
+    # msgspec decodes a JSONL line into a record, validating field types in C,
+    # without building an intermediate dict.
+    _NOTE_DECODER = msgspec.json.Decoder(_NoteRecord)
+    _NOTE_BATCH_DECODER = msgspec.json.Decoder(list[_NoteRecord])
+else:  # pragma: no cover - optional dependency
+    _NOTE_DECODER = _NOTE_BATCH_DECODER = None
+# Lines decoded per JSON array, bounding the size of the joined buffer.
+_DECODE_BATCH_SIZE = 4096
+
+
+def _decode_payload(line: bytes) -> dict[str, object] | None:
+    try:
+        payload = loads(line)
+    except ValueError:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def _note_from_record(record: "_NoteRecord") -> StickyNote | None:
+    # from_dict normalizes timestamps to UTC and drops empty creators; use the
+    # decoded record only when no such normalization is needed.
+    if record.created_at.tzinfo is not _UTC or record.creator == "":
+        return None
+    return StickyNote(
+        id=sys.intern(record.id),
+        message=record.message,
+        context_regex=record.context_regex,
+        created_at=record.created_at,
+        creator=record.creator,
+        trigger_snippets=record.trigger_snippets,
+    )
+
+
+def _decode_note(line: bytes) -> StickyNote | None:
+    if _NOTE_DECODER is not None:
+        try:
+            note = _note_from_record(_NOTE_DECODER.decode(line))
+        except ValueError:
+            note = None
+        if note is not None:
+            return note
+
+    payload = _decode_payload(line)
+    if payload is None:
+        return None
+    try:
+        return StickyNote.from_dict(payload)
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def _decode_notes(lines: list[bytes]) -> list[StickyNote]:
+    """Decode ``lines`` as notes, one JSON array per batch instead of one parse per line.
+
+    A batch containing a malformed line is decoded line by line instead, so a
+    bad line only drops itself.
+    """
+
+    notes: list[StickyNote] = []
+    for start in range(0, len(lines), _DECODE_BATCH_SIZE):
+        batch = lines[start : start + _DECODE_BATCH_SIZE]
+        decoded = _decode_batch(batch)
+        if decoded is None:
+            notes.extend(note for note in map(_decode_note, batch) if note is not None)
+        else:
+            notes.extend(decoded)
+    return notes
+
+
+def _decode_batch(lines: list[bytes]) -> list[StickyNote] | None:
+    # A line holding several comma-separated values joins into the array as
+    # several elements, after which elements and lines no longer pair up.
+    data = b"[" + b",".join(lines) + b"]"
+    if _NOTE_BATCH_DECODER is not None:
+        try:
+            decoded = _NOTE_BATCH_DECODER.decode(data)
+        except ValueError:
+            return None
+        if len(decoded) != len(lines):
+            return None
+        notes = []
+        for line, record in zip(lines, decoded):
+            # Lines that need normalizing go through from_dict.
+            note = _note_from_record(record) or _decode_note(line)
+            if note is not None:
+                notes.append(note)
+        return notes
+
+    try:
+        payloads = loads(data)
+    except ValueError:
+        return None
+    if len(payloads) != len(lines):
+        return None
+    notes = []
+    for payload in payloads:
+        if not isinstance(payload, dict):
+            continue
+        try:
+            notes.append(StickyNote.from_dict(payload))
+        except (KeyError, ValueError, TypeError):
+            continue
+    return notes
+
+
+@dataclass(slots=True)
+class _Snapshot:
+    """Parsed contents of the notes file at a given (mtime_ns, size)."""
+
+    stamp: tuple[int, int]
+    #: The most recent note per id, in the order each id was first stored.
+    notes: tuple[StickyNote, ...]
+    by_id: dict[str, StickyNote]
+    #: Number of notes in the file, superseded ones included.
+    stored: int
+    _pattern_set: tuple[tuple[tuple[str, ...], ...], PatternSet] | None = None
+
+    @classmethod
+    def build(cls, stamp: tuple[int, int], notes: Iterable[StickyNote]) -> "_Snapshot":
+        by_id: dict[str, StickyNote] = {}
+        stored = 0
+        for note in notes:
+            by_id[note.id] = note
+            stored += 1
+        return cls(stamp=stamp, notes=tuple(by_id.values()), by_id=by_id, stored=stored)
+
+    def pattern_set(self) -> tuple[tuple[tuple[str, ...], ...], PatternSet]:
+        """Return a :class:`PatternSet` over the distinct valid note regexes.
+
+        The first item is a column parallel to the set's patterns holding the
+        ids of the notes that use each regex.
+        """
+
+        if self._pattern_set is None:
+            patterns: dict[str, Pattern[str]] = {}
+            ids: dict[str, list[str]] = {}
+            for note in self.notes:
+                try:
+                    patterns.setdefault(note.context_regex, note.pattern)
+                except ValueError as exc:
+                    logger.warning("Skipping note %s due to invalid regex: %s", note.id, exc)
+                    continue
+                ids.setdefault(note.context_regex, []).append(note.id)
+            self._pattern_set = (
+                tuple(tuple(ids[source]) for source in patterns),
+                PatternSet(list(patterns.values())),
+            )
+        return self._pattern_set
+
+
+_EMPTY_SNAPSHOT = _Snapshot(stamp=(0, 0), notes=(), by_id={}, stored=0)
+
+
 class StickyNoteStore:
     """JSONL-backed persistence for sticky notes."""
 
@@ -70,32 +310,249 @@ class StickyNoteStore:
         self.notes_file = notes_file
         self.notes_file.parent.mkdir(parents=True, exist_ok=True)
         self.notes_file.touch(exist_ok=True)
+        self._snapshot: _Snapshot | None = None
+        self._handle: BinaryIO | None = None
+        self._lock_handle: BinaryIO | None = None
+        snapshot = self._current()
+        if snapshot.stored > _COMPACTION_RATIO * len(snapshot.by_id):
+            self.compact()
+
+    def __enter__(self) -> "StickyNoteStore":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the append and lock handles; a later append reopens them."""
+
+        self._close_append_handle()
+        if self._lock_handle is not None:
+            self._lock_handle.close()
+            self._lock_handle = None
+
+    def _close_append_handle(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
 
     def append(self, note: StickyNote) -> None:
-        with self.notes_file.open("a", encoding="utf-8") as handle:
-            handle.write(json.dumps(note.to_dict(), ensure_ascii=False) + "\n")
+        self.append_many((note,))
 
-    def iter_notes(self) -> Iterator[StickyNote]:
-        if not self.notes_file.exists():
-            return iter(())
+    def append_many(self, notes: Iterable[StickyNote]) -> None:
+        """Append ``notes`` with a single write through the long-lived handle.
+
+        The handle is flushed before returning so readers, including
+        :meth:`all_notes`, see the new lines immediately.
+        """
+
+        data = b"".join(note.as_jsonl_bytes() for note in notes)
+        if not data:
+            return
+        with self._locked():
+            handle = self._append_handle()
+            handle.write(data)
+            handle.flush()
+
+    def compact(self) -> int:
+        """Rewrite the store with only the most recent note per id.
+
+        Each id keeps the original line of its most recent note, at the
+        position of its first line, so hand-added keys and timestamp offsets
+        survive. Lines that do not decode, such as a hand edit with a typo,
+        are copied through unchanged so they can still be fixed. The new file
+        is written beside the store, synced and then swapped in, so a crash
+        leaves either the old or the new file. Appends through any store wait
+        for the swap. Returns the number of notes removed, or 0 when the store
+        changed while it was being rewritten.
+        """
+
+        with self._locked():
+            return self._compact()
+
+    def _compact(self) -> int:
+        snapshot = self._current()
+        with self.notes_file.open("rb") as handle:
+            data = handle.read()
+        # (id, line) per decoded line, or (None, line) for lines kept as they are.
+        lines: list[tuple[str | None, bytes]] = []
+        latest_lines: dict[str, bytes] = {}
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            note = _decode_note(line)
+            if note is None:
+                lines.append((None, line))
+            else:
+                lines.append((note.id, line))
+                latest_lines[note.id] = line
+        chunks: list[bytes] = []
+        for note_id, line in lines:
+            if note_id is None:
+                chunks.append(line + b"\n")
+            elif note_id in latest_lines:
+                chunks.append(latest_lines.pop(note_id) + b"\n")
 
+        notes = snapshot.notes
+        removed = snapshot.stored - len(notes)
+        fd, tmp_name = tempfile.mkstemp(dir=self.notes_file.parent, prefix=self.notes_file.name, suffix=".tmp")
+        tmp_file = Path(tmp_name)
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(b"".join(chunks))
+                handle.flush()
+                os.fsync(handle.fileno())
+            stat = self.notes_file.stat()
+            if (stat.st_mtime_ns, stat.st_size) != snapshot.stamp:
+                # Another writer appended meanwhile; keep its notes.
+                tmp_file.unlink(missing_ok=True)
+                return 0
+            # mkstemp creates the file readable by its owner only.
+            os.chmod(tmp_file, stat_module.S_IMODE(stat.st_mode))
+            # Windows cannot replace a file that is still open.
+            self._close_append_handle()
+            os.replace(tmp_file, self.notes_file)
+        except BaseException:
+            tmp_file.unlink(missing_ok=True)
+            raise
+
+        stat = self.notes_file.stat()
+        self._snapshot = _Snapshot.build((stat.st_mtime_ns, stat.st_size), notes)
+        return removed
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold an exclusive lock shared by every store on this notes file.
+
+        The lock lives on a separate file because compaction replaces the
+        notes file itself; like the append handle, it stays open between
+        calls. Without ``fcntl`` (Windows) nothing is locked.
+        """
+
+        if fcntl is None:  # pragma: no cover - not available on Windows
+            yield
+            return
+        if self._lock_handle is None:
+            self._lock_handle = self.notes_file.with_name(self.notes_file.name + ".lock").open("ab")
+        fileno = self._lock_handle.fileno()
+        fcntl.flock(fileno, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fileno, fcntl.LOCK_UN)
+
+    def _append_handle(self) -> BinaryIO:
+        # Reopen when the file was removed or replaced since the handle was
+        # opened, otherwise new notes would land in the orphaned file.
+        if self._handle is not None:
+            try:
+                current = self.notes_file.stat().st_ino
+            except FileNotFoundError:
+                current = None
+            if current != os.fstat(self._handle.fileno()).st_ino:
+                self._close_append_handle()
+        if self._handle is None:
+            self._handle = self.notes_file.open("ab", buffering=_WRITE_BUFFER_SIZE)
+        return self._handle
+
+    def iter_notes(self) -> Iterator[StickyNote]:
         def _generator() -> Iterator[StickyNote]:
-            with self.notes_file.open("r", encoding="utf-8") as handle:
-                for line in handle:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        payload = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-                    try:
-                        yield StickyNote.from_dict(payload)
-                    except (KeyError, ValueError, TypeError):
-                        continue
+            for line in self._iter_lines():
+                note = _decode_note(line)
+                if note is not None:
+                    yield note
 
         return _generator()
 
-    def all_notes(self) -> list[StickyNote]:
-        return list(self.iter_notes())
+    def _iter_lines(self) -> Iterator[bytes]:
+        try:
+            size = self.notes_file.stat().st_size
+        except FileNotFoundError:
+            return
+        if size >= _CHUNKED_READ_THRESHOLD:
+            lines: Iterable[bytes] = self._iter_chunked_lines()
+        else:
+            # Sticky note stores are usually small: one read plus splitlines()
+            # is cheaper than iterating the file object line by line.
+            with self.notes_file.open("rb") as handle:
+                lines = handle.read().splitlines()
+        # Surrounding whitespace needs no strip(); the JSON parsers ignore it.
+        for line in lines:
+            # Every note is a JSON object, so blank and foreign lines are
+            # dropped by their first byte instead of by a failed parse.
+            if line[:1] != b"{":
+                line = line.lstrip()
+                if line[:1] != b"{":
+                    continue
+            yield line
+
+    def _iter_chunked_lines(self) -> Iterator[bytes]:
+        # Large stores are read a chunk at a time so the whole file is never
+        # copied into one bytes object; only each line is. Unlike a mapping,
+        # a store truncated while it is read (by an editor or a ">" redirect)
+        # just ends the read early instead of killing the process with SIGBUS.
+        buffer = bytearray()
+        with self.notes_file.open("rb") as handle:
+            while chunk := handle.read(_READ_CHUNK_SIZE):
+                # The carried-over tail holds no newline; search only the new bytes.
+                searched = len(buffer)
+                buffer += chunk
+                start = 0
+                newline = buffer.find(b"\n", searched)
+                while newline != -1:
+                    yield bytes(buffer[start:newline])
+                    start = newline + 1
+                    newline = buffer.find(b"\n", start)
+                del buffer[:start]
+        if buffer:
+            yield bytes(buffer)
+
+    def all_notes(self) -> Sequence[StickyNote]:
+        """Return the most recent note per id, re-reading the file only after it changes.
+
+        Notes stored again under an existing id supersede the earlier version
+        whether or not the file has been compacted since.
+
+        Notes are reused between calls while the file's mtime and size are
+        unchanged, so their compiled patterns are kept as well. The result is
+        the store's own read-only snapshot rather than a copy; use ``list()``
+        on it when a mutable list is needed.
+        """
+
+        return self._current().notes
+
+    def match(self, texts: Sequence[str]) -> list[tuple[StickyNote, list[int]]]:
+        """Return every stored note whose ``context_regex`` matches any of ``texts``.
+
+        Each note comes with the indexes of the texts it matches, in the order
+        of :meth:`all_notes`. Every distinct regex is searched once per text,
+        all of them together where the pattern set allows it. Notes with an
+        invalid regex never match.
+        """
+
+        snapshot = self._current()
+        ids, pattern_set = snapshot.pattern_set()
+        search = pattern_set.search
+        hits: dict[str, list[int]] = {}
+        for index, text in enumerate(texts):
+            if not text:
+                continue
+            for pattern_index in search(text):
+                for note_id in ids[pattern_index]:
+                    hits.setdefault(note_id, []).append(index)
+        if not hits:
+            return []
+        return [(note, hits[note.id]) for note in snapshot.notes if note.id in hits]
+
+    def _current(self) -> _Snapshot:
+        try:
+            stat = self.notes_file.stat()
+        except FileNotFoundError:
+            self._snapshot = None
+            return _EMPTY_SNAPSHOT
+
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if self._snapshot is None or self._snapshot.stamp != stamp:
+            self._snapshot = _Snapshot.build(stamp, _decode_notes(list(self._iter_lines())))
+        return self._snapshot
 
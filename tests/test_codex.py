@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import json
+import os
 import sys
+import threading
 import types
 from datetime import datetime, timezone
 from pathlib import Path
@@ -9,6 +11,7 @@ from pathlib import Path
 import pytest
 
 from server.config import ServerConfig
+from server.frameworks.base import SessionContext
 from server.frameworks.codex import CodexHistoryProvider
 
 
@@ -271,4 +274,179 @@ def test_codex_history_provider_filters_noise(tmp_path):
     assert any(text == "**Hidden thoughts**" for text in texts)
 
 
+def test_codex_history_provider_caches_context_until_history_changes(tmp_path):
+    history_dir = tmp_path / "history"
+    history_dir.mkdir()
+
+    session_file = history_dir / "session.jsonl"
+    lines = [
+        {
+            "timestamp": _iso(datetime(2025, 5, 7, 17, 24, 21, tzinfo=timezone.utc)),
+            "type": "session_meta",
+            "payload": {"id": "session-id"},
+        },
+        {
+            "timestamp": _iso(datetime(2025, 5, 7, 17, 25, 0, tzinfo=timezone.utc)),
+            "type": "response_item",
+            "payload": {
+                "type": "message",
+                "payload": {
+                    "role": "user",
+                    "content": [
+                        {"type": "input_text", "text": "First message"},
+                    ],
+                },
+            },
+        },
+    ]
+
+    with session_file.open("w", encoding="utf-8") as handle:
+        for line in lines:
+            handle.write(json.dumps(line) + "\n")
+
+    provider = CodexHistoryProvider(history_dir)
+    first = provider.cached_context("session-id")
+    assert provider.cached_context("session-id") is first
+
+    follow_up = dict(lines[1])
+    follow_up["payload"] = {
+        "type": "message",
+        "payload": {
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": "Second message"}],
+        },
+    }
+    with session_file.open("a", encoding="utf-8") as handle:
+        handle.write(json.dumps(follow_up) + "\n")
+
+    refreshed = provider.cached_context("session-id")
+    assert refreshed is not first
+    assert [entry.text for entry in refreshed.entries] == ["First message", "Second message"]
+
+
+def test_codex_history_provider_skips_compact_noise_lines(tmp_path):
+    history_dir = tmp_path / "history"
+    history_dir.mkdir()
+
+    session_file = history_dir / "session.jsonl"
+    lines = [
+        {"type": "session_meta", "payload": {"id": "session-id"}},
+        {"type": "turn_context", "payload": {"cwd": "/tmp"}},
+        {"type": "event_msg", "payload": {"type": "token_count", "message": "usage"}},
+        {
+            "type": "response_item",
+            "payload": {
+                "type": "message",
+                "payload": {
+                    "role": "user",
+                    "content": [
+                        {"type": "input_text", "text": 'Why is "type":"turn_context" logged?'},
+                    ],
+                },
+            },
+        },
+    ]
+
+    with session_file.open("w", encoding="utf-8") as handle:
+        for line in lines:
+            handle.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+    provider = CodexHistoryProvider(history_dir)
+    context = provider.load_context("session-id")
+
+    assert [entry.text for entry in context.entries] == ['Why is "type":"turn_context" logged?']
+
+
+def test_codex_history_provider_prefers_matching_session_over_newer_rollouts(tmp_path):
+    history_dir = tmp_path / "history"
+    history_dir.mkdir()
+
+    def _write(name, session_id, text):
+        lines = [
+            {"type": "session_meta", "payload": {"id": session_id}},
+            {
+                "type": "response_item",
+                "payload": {
+                    "type": "message",
+                    "payload": {"role": "user", "content": [{"type": "input_text", "text": text}]},
+                },
+            },
+        ]
+        path = history_dir / name
+        with path.open("w", encoding="utf-8") as handle:
+            for line in lines:
+                handle.write(json.dumps(line) + "\n")
+        return path
+
+    target = _write("rollout-a.jsonl", "target-session", "Target text")
+    other = _write("rollout-b.jsonl", "other-session", "Other text")
+    os.utime(target, (1_000, 1_000))
+    os.utime(other, (2_000, 2_000))
+
+    provider = CodexHistoryProvider(history_dir)
+
+    assert [entry.text for entry in provider.load_context("target-session").entries] == ["Target text"]
+    assert [entry.text for entry in provider.load_context("unknown-session").entries] == ["Other text"]
+
+
+def test_codex_history_provider_keeps_lines_with_lone_surrogates(tmp_path):
+    history_dir = tmp_path / "history"
+    history_dir.mkdir()
+
+    session_file = history_dir / "session.jsonl"
+    lines = [
+        {"type": "session_meta", "payload": {"id": "session-id"}},
+        {
+            "type": "response_item",
+            "payload": {
+                "type": "message",
+                "payload": {
+                    "role": "user",
+                    "content": [{"type": "input_text", "text": "Cut mid-emoji \ud83d"}],
+                },
+            },
+        },
+    ]
+
+    with session_file.open("w", encoding="utf-8") as handle:
+        for line in lines:
+            handle.write(json.dumps(line) + "\n")
+
+    provider = CodexHistoryProvider(history_dir)
+    context = provider.load_context("session-id")
+
+    assert [entry.text for entry in context.entries] == ["Cut mid-emoji \ud83d"]
+
+
+def test_cached_context_tolerates_concurrent_calls(tmp_path):
+    class _InstantProvider(CodexHistoryProvider):
+        context_ttl = 0.0
+
+        def context_version(self, session_id):
+            return session_id
+
+        def load_context(self, session_id):
+            return SessionContext(session_id=session_id, entries=())
+
+    provider = _InstantProvider(tmp_path)
+    errors = []
+
+    def worker(offset):
+        try:
+            for index in range(300):
+                provider.cached_context(f"s{(index + offset) % 400}")
+        except Exception as exc:  # pragma: no cover - only on failure
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
 
+    assert errors == []
@@ -1,12 +1,13 @@
 """Tests for the GitHub Copilot history provider."""
 
 import json
+import os
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from server.frameworks.copilot import CopilotHistoryProvider
+from server.frameworks.copilot import CopilotHistoryProvider, _has_lone_surrogate_escape
 
 
 @pytest.fixture
@@ -94,3 +95,150 @@ def test_load_context_not_found(mock_expanduser, provider, tmp_path):
     
     with pytest.raises(FileNotFoundError):
         provider.load_context("non-existent-session")
+
+
+@patch("server.frameworks.copilot.os.path.expanduser")
+def test_load_context_nested_history_root(mock_expanduser, provider, history_root, tmp_path):
+    """Test discovering chatSessions directories nested below history_root."""
+    mock_expanduser.return_value = str(tmp_path / "nonexistent")
+
+    chat_sessions = history_root / "workspace-hash" / "chatSessions"
+    chat_sessions.mkdir(parents=True)
+    (history_root / "workspace-hash" / "state.json").write_text("{}")
+
+    session_id = "nested-session"
+    data = {
+        "requests": [
+            {
+                "id": "req3",
+                "timestamp": 1678886400000,
+                "message": {"text": "Nested hello"},
+                "response": []
+            }
+        ]
+    }
+    with (chat_sessions / f"{session_id}.json").open("w") as f:
+        json.dump(data, f)
+
+    assert provider._find_session_files(session_id) == [chat_sessions / f"{session_id}.json"]
+
+    context = provider.load_context(session_id)
+
+    assert context.session_id == session_id
+    assert context.entries[0].text == "Nested hello"
+
+
+def test_parse_history_file_streams_large_sessions(provider, tmp_path, monkeypatch):
+    """Test that large session files parse the same when streamed with ijson."""
+    pytest.importorskip("ijson")
+    monkeypatch.setattr("server.frameworks.copilot._STREAMING_THRESHOLD", 0)
+
+    session_file = tmp_path / "large-session.json"
+    data = {
+        "version": 3,
+        "requests": [
+            {
+                "id": "req4",
+                "timestamp": 1678886400500,
+                "message": {"text": "Run the tests"},
+                "response": [
+                    {"value": "Running them now"},
+                    {
+                        "kind": "toolInvocationSerialized",
+                        "toolId": "run_in_terminal",
+                        "toolCallId": "call-1",
+                        "resultDetails": {"input": {"command": "pytest"}, "output": [{"value": "ok"}]},
+                    },
+                ],
+            }
+        ],
+    }
+    with session_file.open("w") as f:
+        json.dump(data, f)
+
+    entries = provider._parse_history_file(session_file)
+
+    assert [entry.text for entry in entries] == [
+        "Run the tests",
+        "Running them now",
+        "Tool Call: run_in_terminal\nArguments: {'command': 'pytest'}",
+    ]
+    assert entries[0].timestamp.timestamp() == 1678886400.5
+    assert entries[2].metadata["output"] == [{"value": "ok"}]
+
+
+@pytest.mark.parametrize("parser", ["simdjson", "loads", "ijson"])
+def test_parse_history_file_accepts_lone_surrogates(provider, tmp_path, monkeypatch, parser):
+    """Test that strings cut mid-emoji do not make the session unreadable."""
+    if parser == "loads":
+        monkeypatch.setattr("server.frameworks.copilot.simdjson", None)
+    else:
+        pytest.importorskip(parser)
+    if parser == "ijson":
+        monkeypatch.setattr("server.frameworks.copilot._STREAMING_THRESHOLD", 0)
+
+    session_file = tmp_path / "cut-session.json"
+    data = {
+        "requests": [
+            {
+                "id": "req5",
+                "timestamp": 1678886400000,
+                "message": {"text": "Cut mid-emoji \ud83d"},
+                "response": [{"value": "Noted \U0001F600"}],
+            }
+        ]
+    }
+    with session_file.open("w") as f:
+        json.dump(data, f)
+
+    entries = provider._parse_history_file(session_file)
+
+    assert [entry.text for entry in entries] == ["Cut mid-emoji \ud83d", "Noted \U0001F600"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1024])
+@pytest.mark.parametrize(
+    ("content", "expected"),
+    [(rb'"\ud83d\ude00 x"', False), (rb'"cut \ud83d"', True), (rb'"x \ude00"', True), (b'"plain"', False)],
+)
+def test_has_lone_surrogate_escape_across_chunks(tmp_path, monkeypatch, chunk_size, content, expected):
+    monkeypatch.setattr("server.frameworks.copilot._SCAN_CHUNK_SIZE", chunk_size)
+    session_file = tmp_path / "session.json"
+    session_file.write_bytes(content)
+
+    assert _has_lone_surrogate_escape(session_file) is expected
+
+
+@patch("server.frameworks.copilot.os.path.expanduser")
+def test_find_session_files_probes_workspace_storage_root(mock_expanduser, provider, history_root, tmp_path, monkeypatch):
+    """Test that a session under history_root/<hash>/chatSessions is found without a full scan."""
+    mock_expanduser.return_value = str(tmp_path / "nonexistent")
+    chat_sessions = history_root / "workspace-hash" / "chatSessions"
+    chat_sessions.mkdir(parents=True)
+    session_file = chat_sessions / "probed-session.json"
+    session_file.write_text('{"requests": []}')
+
+    def fail_scan(*args):
+        raise AssertionError("full scan should not be needed")
+
+    monkeypatch.setattr("server.frameworks.copilot.scan_files", fail_scan)
+
+    assert provider._find_session_files("probed-session") == [session_file]
+
+
+@patch("server.frameworks.copilot.os.path.expanduser")
+def test_load_context_falls_back_to_newest_session(mock_expanduser, provider, history_root, tmp_path):
+    """Test that an unknown session id loads the most recently modified session."""
+    mock_expanduser.return_value = str(tmp_path / "nonexistent")
+    chat_sessions = history_root / "workspace-hash" / "chatSessions"
+    chat_sessions.mkdir(parents=True)
+    for age, name in enumerate(["newest", "older", "oldest"]):
+        session_file = chat_sessions / f"{name}.json"
+        data = {"requests": [{"id": name, "message": {"text": f"From {name}"}, "response": []}]}
+        session_file.write_text(json.dumps(data))
+        os.utime(session_file, (1_700_000_000 - age, 1_700_000_000 - age))
+
+    context = provider.load_context("unknown-session")
+
+    assert context.session_id == "newest"
+    assert context.entries[0].text == "From newest"
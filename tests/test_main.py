@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+import types
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("fastmcp")
+
+from server.config import ServerConfig
+from server.frameworks.base import HistoryEntry, SessionContext
+from server.main import _collect_snippets, build_app
+from server.patterns import compile_regex, re2
+from server.storage import StickyNote, StickyNoteStore
+
+
+def _write_session(history_dir):
+    history_dir.mkdir(parents=True)
+    lines = [
+        {"type": "session_meta", "payload": {"id": "session-id"}},
+        {
+            "type": "response_item",
+            "payload": {
+                "type": "message",
+                "payload": {
+                    "role": "user",
+                    "content": [{"type": "input_text", "text": "Please fix the docs\nthen run pytest"}],
+                },
+            },
+        },
+        {
+            "type": "response_item",
+            "payload": {"type": "function_call", "name": "shell", "arguments": '{"cmd": "ls"}'},
+        },
+    ]
+    with (history_dir / "session.jsonl").open("w", encoding="utf-8") as handle:
+        for line in lines:
+            handle.write(json.dumps(line) + "\n")
+
+
+def _read_notes(tmp_path, notes):
+    _write_session(tmp_path / "history")
+    cfg = ServerConfig(framework="codex", notes_dir=tmp_path / "notes", history_dir=tmp_path / "history")
+    StickyNoteStore(cfg.notes_file).append_many(notes)
+    app = build_app(cfg)
+    tools = {tool.name: tool for tool in asyncio.run(app.list_tools())}
+    read = tools["read_relevant_sticky_notes"].fn
+    ctx = types.SimpleNamespace(session_id="session-id")
+    return read(ctx=ctx), read(ctx=ctx)
+
+
+@pytest.mark.parametrize(
+    "patterns",
+    [
+        [r"\bdocs\b", "^then run", "never matches"],
+        [r"\bdocs\b", "(?i)PLEASE", r"(s)he\1ll|call:shell"],
+        ["never matches", "nor this"],
+    ],
+)
+def test_read_relevant_sticky_notes_matches_like_searching_each_note(tmp_path, monkeypatch, patterns):
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    notes = [
+        StickyNote(id=f"note-{index}", message=f"Note {index}", context_regex=pattern, created_at=created_at)
+        for index, pattern in enumerate(patterns)
+    ]
+    notes.append(StickyNote(id="note-0", message="Duplicate", context_regex="pytest", created_at=created_at))
+
+    def _match_each(self, texts):
+        matched = []
+        for note in self.all_notes():
+            pattern = re.compile(note.context_regex, re.MULTILINE)
+            indexes = [index for index, text in enumerate(texts) if text and pattern.search(text)]
+            if indexes:
+                matched.append((note, indexes))
+        return matched
+
+    batched = _read_notes(tmp_path / "batched", notes)
+    monkeypatch.setattr(StickyNoteStore, "match", _match_each)
+    one_by_one = _read_notes(tmp_path / "one-by-one", notes)
+
+    assert batched == one_by_one
+    assert batched[1] == []
+
+
+def test_read_relevant_sticky_notes_returns_newest_version_of_a_note(tmp_path):
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    notes = [
+        StickyNote(id="note", message="OLD advice", context_regex="docs", created_at=created_at),
+        StickyNote(id="note", message="NEW advice", context_regex="docs", created_at=created_at),
+    ]
+
+    first, _ = _read_notes(tmp_path, notes)
+
+    assert [note["message"] for note in first] == ["NEW advice"]
+
+
+@pytest.mark.skipif(re2 is None, reason="google-re2 is not installed")
+def test_collect_snippets_only_iterates_entries_the_pattern_matches():
+    entries = tuple(HistoryEntry(timestamp=None, kind="message", text=text) for text in ["aab", "a" * 40 + "c"])
+    context = SessionContext(session_id="session-id", entries=entries)
+
+    assert _collect_snippets(compile_regex("(a+)+b"), context, with_metadata=False) == ["aab"]
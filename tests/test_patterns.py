@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import re
+import warnings
+
+import pytest
+
+from server import patterns
+from server.patterns import PatternSet, combine_patterns, compile_regex
+
+
+def test_compile_regex_caches_patterns():
+    assert compile_regex("sticky") is compile_regex("sticky")
+
+
+def test_compile_regex_rejects_invalid_patterns():
+    with pytest.raises(ValueError):
+        compile_regex("(unterminated")
+
+
+def test_compile_regex_matches_like_re():
+    text = "first line\ncafé 42\nfoo-foo"
+
+    assert compile_regex("^café").search(text)
+    assert compile_regex(r"\w+é").search(text)
+    assert compile_regex(r"(foo)-\1$").search(text)
+    assert [match.span() for match in compile_regex("o").finditer(text)] == [(20, 21), (21, 22), (24, 25), (25, 26)]
+
+
+def test_compile_regex_keeps_re_semantics_where_re2_differs():
+    assert compile_regex("foo$", 0).search("foo\n")
+    with pytest.warns(FutureWarning):
+        posix_class = compile_regex("[[:alpha:]]")
+    assert not posix_class.search("abc")
+    assert posix_class.search("a]")
+
+
+@pytest.mark.parametrize(
+    ("source", "text"),
+    [
+        ("(?i)install", "İNSTALL"),
+        ("(?i)[h-j]nstall", "ınstall"),
+        (r"(?i)\x69nstall", "İnstall"),
+        ("(?i:install)", "İNSTALL"),
+        ("(?i:i)", "İ"),
+        ("(?i:ı)", "I"),
+    ],
+)
+def test_compile_regex_keeps_re_case_folding(source, text):
+    assert compile_regex(source).search(text)
+
+
+@pytest.mark.skipif(patterns.re2 is None, reason="google-re2 is not installed")
+@pytest.mark.parametrize("source", ["(?i)note", "(?i:note)", "(?m-i:note)"])
+def test_compile_regex_uses_re2_for_inline_flag_groups(source):
+    pattern = compile_regex(source)
+
+    assert not isinstance(pattern, re.Pattern)
+    assert pattern.search("a note")
+
+
+@pytest.mark.parametrize(("source", "text"), [("$", "abc"), ("(a)*?", "xa"), ("x*", "axxb\nx")])
+def test_compile_regex_finditer_matches_like_re(source, text):
+    expected = [match.span() for match in re.finditer(source, text, re.MULTILINE)]
+
+    assert [match.span() for match in compile_regex(source).finditer(text)] == expected
+
+
+def test_compile_regex_matches_text_with_lone_surrogates():
+    text = "cut \ud83d emoji"
+
+    assert compile_regex("emoji").search(text).span() == (6, 11)
+    assert [match.group() for match in compile_regex(r"[a-z]+").finditer(text)] == ["cut", "emoji"]
+
+
+def test_combine_patterns_matches_wherever_any_pattern_matches():
+    combined = combine_patterns([compile_regex("^café"), compile_regex(r"foo-\w+$"), compile_regex("^café")])
+
+    assert combined.search("tea\ncafé")
+    assert combined.search("foo-bar\nbaz")
+    assert not combined.search("a café, foo-")
+
+
+@pytest.mark.parametrize(
+    "sources",
+    [
+        ["single"],
+        ["(?i)sticky", "note"],
+        ["(?s)a.b", "note"],
+        [r"(foo)-\1", "note"],
+        ["(?P<word>foo)(?P=word)", "note"],
+        ["(?P<word>foo)", "(?P<word>bar)"],
+    ],
+)
+def test_combine_patterns_declines_patterns_it_cannot_join(sources):
+    assert combine_patterns([compile_regex(source) for source in sources]) is None
+
+
+def test_pattern_set_matches_like_searching_each_pattern():
+    sources = ["^café", r"(foo)-\1$", r"(?<=first )line", "missing", "(?i)FIRST", r"\d+"]
+    patterns = [compile_regex(source) for source in sources]
+    pattern_set = PatternSet(patterns + [re.compile("line.café", re.DOTALL)])
+    text = "first line\ncafé 42\nfoo-foo"
+
+    assert len(pattern_set) == 7
+    assert list(pattern_set.search(text)) == [0, 1, 2, 4, 5, 6]
+    assert list(pattern_set.search("")) == []
+    assert list(PatternSet([compile_regex("^$")]).search("line\n")) == [0]
+
+
+@pytest.mark.parametrize(
+    ("source", "text"),
+    [
+        ("ab{,3}c", "abbc"),
+        (r"a\sb", "a\x1cb"),
+        (r"\bnote", "\x1fnote"),
+        ("[[:digit:]]", "d]"),
+        ("(?i)install", "İNSTALL"),
+        ("(?i)ა", "Ა"),
+        ("(?i)ʂ", "Ʂ"),
+        ("(?i:ა)(?=x)", "Აx"),
+        ("(?i:i)(?=x)", "İx"),
+    ],
+)
+def test_pattern_set_keeps_matches_hyperscan_reads_differently(source, text):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        pattern_set = PatternSet([compile_regex(source), compile_regex("unrelated")])
+
+    assert list(pattern_set.search(text)) == [0]
+
+
+@pytest.mark.skipif(patterns.hyperscan is None, reason="hyperscan is not installed")
+def test_pattern_set_remembers_patterns_hyperscan_rejects(monkeypatch):
+    sources = [r"caf\u00e9"] + [f"note {index}" for index in range(5)]
+    PatternSet([compile_regex(source) for source in sources])
+    compiles = []
+    hs_compile = patterns._hs_compile
+    monkeypatch.setattr(patterns, "_hs_compile", lambda batch: compiles.append(batch) or hs_compile(batch))
+
+    pattern_set = PatternSet([compile_regex(source) for source in sources + ["note 5"]])
+
+    assert len(compiles) == 1
+    assert list(pattern_set.search("café note 5")) == [0, 6]
+
+
+@pytest.mark.skipif(patterns.hyperscan is None, reason="hyperscan is not installed")
+def test_pattern_set_searches_with_re_when_the_database_does_not_compile(monkeypatch):
+    hs_compile = patterns._hs_compile
+
+    def _compile_alone(batch):
+        if len(batch) > 1:
+            raise patterns.hyperscan.error("too large")
+        return hs_compile(batch)
+
+    monkeypatch.setattr(patterns, "_hs_compile", _compile_alone)
+    monkeypatch.setattr(patterns, "_HS_ACCEPTED", {})
+
+    pattern_set = PatternSet([compile_regex("first"), compile_regex("second")])
+
+    assert pattern_set._database is None
+    assert list(pattern_set.search("second then first")) == [0, 1]
+
+
+@pytest.mark.parametrize(
+    "sources", [["^café", r"(foo)-\1$", "(?i)FIRST"], ["^café", r"\bfoo-foo$", "first"]]
+)
+def test_pattern_set_search_with_and_without_an_alternation(sources):
+    pattern_set = PatternSet([compile_regex(source) for source in sources])
+
+    assert list(pattern_set.search("the first line")) == [2]
+    assert list(pattern_set.search("café\nbar\nfoo-foo")) == [0, 1]
+    assert list(pattern_set.search("foo-bar")) == []
+    assert list(pattern_set.search("cut \ud83d first")) == [2]
@@ -2,6 +2,9 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 
+import pytest
+
+from server import storage
 from server.session_state import SessionNoteTracker
 from server.storage import StickyNote, StickyNoteStore
 
@@ -35,3 +38,250 @@ def test_session_note_tracker_filters_seen():
     assert tracker.has_shown(session_id, "note-a")
     assert tracker.unseen(session_id, ["note-a", "note-b"]) == ["note-b"]
 
+
+def test_sticky_note_store_reuses_notes_until_file_changes(tmp_path):
+    store = StickyNoteStore(tmp_path / "sticky_notes.jsonl")
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    store.append(StickyNote(id="note-1", message="First", context_regex="first", created_at=created_at))
+
+    first = store.all_notes()
+    second = store.all_notes()
+    assert second is first
+    assert isinstance(first, tuple)
+    assert second[0].pattern is first[0].pattern
+
+    store.append(StickyNote(id="note-2", message="Second", context_regex="(", created_at=created_at))
+
+    refreshed = store.all_notes()
+    assert [note.id for note in refreshed] == ["note-1", "note-2"]
+    with pytest.raises(ValueError):
+        refreshed[1].pattern
+
+
+def test_sticky_note_store_appends_through_reopenable_handle(tmp_path):
+    notes_file = tmp_path / "sticky_notes.jsonl"
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    with StickyNoteStore(notes_file) as store:
+        store.append_many(
+            StickyNote(id=f"note-{index}", message="Batch", context_regex="batch", created_at=created_at)
+            for index in range(3)
+        )
+        assert [note.id for note in store.all_notes()] == ["note-0", "note-1", "note-2"]
+
+        notes_file.unlink()
+        store.append(StickyNote(id="note-3", message="After", context_regex="after", created_at=created_at))
+        assert [note.id for note in store.all_notes()] == ["note-3"]
+
+    store.append(StickyNote(id="note-4", message="Reopened", context_regex="again", created_at=created_at))
+    assert [note.id for note in store.all_notes()] == ["note-3", "note-4"]
+
+
+def test_sticky_note_store_keeps_newest_note_per_id(tmp_path):
+    store = StickyNoteStore(tmp_path / "sticky_notes.jsonl")
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    store.append(StickyNote(id="note-1", message="Old", context_regex="one", created_at=created_at))
+    store.append(StickyNote(id="note-2", message="Other", context_regex="two", created_at=created_at))
+    store.append(StickyNote(id="note-1", message="New", context_regex="one", created_at=created_at))
+
+    assert [(note.id, note.message) for note in store.all_notes()] == [("note-1", "New"), ("note-2", "Other")]
+
+
+def test_sticky_note_store_normalizes_hand_written_lines(tmp_path):
+    notes_file = tmp_path / "sticky_notes.jsonl"
+    notes_file.write_text(
+        '{"id": "note-1", "message": "Offset", "context_regex": "x", '
+        '"created_at": "2025-01-01T02:00:00+02:00", "creator": ""}\n'
+        '{"id": 2, "message": "Numeric id", "context_regex": "y", '
+        '"created_at": "2025-01-01T00:00:00Z", "trigger_snippets": [1, "two"]}\n'
+        "[]\n",
+        encoding="utf-8",
+    )
+
+    notes = StickyNoteStore(notes_file).all_notes()
+
+    assert [note.id for note in notes] == ["note-1", "2"]
+    assert notes[0].created_at == datetime(2025, 1, 1, tzinfo=timezone.utc)
+    assert notes[0].created_at.tzinfo is timezone.utc
+    assert notes[0].creator is None
+    assert notes[1].trigger_snippets == ["1", "two"]
+
+
+def test_sticky_note_store_matches_text_against_note_patterns(tmp_path):
+    store = StickyNoteStore(tmp_path / "sticky_notes.jsonl")
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    store.append_many([
+        StickyNote(id="docs", message="Docs", context_regex=r"\bdocs?\b", created_at=created_at),
+        StickyNote(id="tests", message="Tests", context_regex="^pytest", created_at=created_at),
+        StickyNote(id="broken", message="Broken", context_regex="(", created_at=created_at),
+    ])
+
+    matched = store.match(["update the docs", "", "pytest -q", "nothing relevant", "docs\npytest"])
+
+    assert [(note.id, indexes) for note, indexes in matched] == [("docs", [0, 4]), ("tests", [2, 4])]
+    assert store.match(["nothing relevant"]) == []
+
+
+def test_sticky_note_store_skips_blank_and_malformed_lines(tmp_path):
+    notes_file = tmp_path / "sticky_notes.jsonl"
+    valid = '{"id": "%s", "message": "Note", "context_regex": "x", "created_at": "2025-01-01T00:00:00Z"}'
+    notes_file.write_text(
+        "\n".join(["", "   ", "not json", '{"id": "truncated"', "  " + valid % "indented", valid % "plain", ""]),
+        encoding="utf-8",
+    )
+
+    store = StickyNoteStore(notes_file)
+
+    assert [note.id for note in store.all_notes()] == ["indented", "plain"]
+
+
+def test_sticky_note_store_reads_large_files_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_CHUNKED_READ_THRESHOLD", 1)
+    monkeypatch.setattr(storage, "_READ_CHUNK_SIZE", 7)
+    notes_file = tmp_path / "sticky_notes.jsonl"
+    store = StickyNoteStore(notes_file)
+    assert not store.all_notes()
+
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    store.append(StickyNote(id="first", message="First", context_regex="x", created_at=created_at))
+    with notes_file.open("a", encoding="utf-8") as handle:
+        handle.write("\r\n")
+    store.append(StickyNote(id="last", message="Last", context_regex="y", created_at=created_at))
+    notes_file.write_bytes(notes_file.read_bytes().rstrip(b"\n"))
+
+    assert [note.id for note in store.all_notes()] == ["first", "last"]
+
+
+def test_sticky_note_store_compacts_superseded_notes(tmp_path):
+    notes_file = tmp_path / "sticky_notes.jsonl"
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    with StickyNoteStore(notes_file) as store:
+        for version in range(3):
+            store.append_many([
+                StickyNote(id="a", message=f"A{version}", context_regex="x", created_at=created_at),
+                StickyNote(id="b", message=f"B{version}", context_regex="y", created_at=created_at),
+            ])
+        assert [(note.id, note.message) for note in store.all_notes()] == [("a", "A2"), ("b", "B2")]
+        assert len(notes_file.read_text(encoding="utf-8").splitlines()) == 6
+
+    store = StickyNoteStore(notes_file)
+
+    assert [(note.id, note.message) for note in store.all_notes()] == [("a", "A2"), ("b", "B2")]
+    assert len(notes_file.read_text(encoding="utf-8").splitlines()) == 2
+    assert not list(tmp_path.glob("*.tmp"))
+
+    store.append(StickyNote(id="c", message="C", context_regex="z", created_at=created_at))
+    assert store.compact() == 0
+    assert [note.id for note in StickyNoteStore(notes_file).all_notes()] == ["a", "b", "c"]
+
+
+@pytest.mark.skipif(storage.fcntl is None, reason="fcntl is not available")
+def test_sticky_note_store_reuses_its_lock_handle(tmp_path):
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    with StickyNoteStore(tmp_path / "sticky_notes.jsonl") as store:
+        store.append(StickyNote(id="a", message="A", context_regex="x", created_at=created_at))
+        lock_handle = store._lock_handle
+        store.append(StickyNote(id="b", message="B", context_regex="y", created_at=created_at))
+
+        assert store._lock_handle is lock_handle
+    assert lock_handle.closed
+
+
+def test_sticky_note_store_closes_its_append_handle_before_compacting(tmp_path, monkeypatch):
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    store = StickyNoteStore(tmp_path / "sticky_notes.jsonl")
+    for version in range(3):
+        store.append(StickyNote(id="a", message=f"A{version}", context_regex="x", created_at=created_at))
+    replace = storage.os.replace
+    open_at_replace = []
+
+    def _replace(source, target):
+        open_at_replace.append(store._handle is not None)
+        replace(source, target)
+
+    monkeypatch.setattr(storage.os, "replace", _replace)
+
+    assert store.compact() == 2
+    assert open_at_replace == [False]
+
+
+def test_sticky_note_store_compaction_yields_to_concurrent_appends(tmp_path, monkeypatch):
+    notes_file = tmp_path / "sticky_notes.jsonl"
+    note = '{"id": "%s", "message": "%s", "context_regex": "x", "created_at": "2025-01-01T00:00:00Z"}\n'
+    notes_file.write_text(note % ("a", "A0") + note % ("a", "A1") + note % ("a", "A2"), encoding="utf-8")
+    fsync = storage.os.fsync
+
+    def _fsync_then_append(fd):
+        fsync(fd)
+        with notes_file.open("a", encoding="utf-8") as handle:
+            handle.write(note % ("b", "B"))
+
+    monkeypatch.setattr(storage.os, "fsync", _fsync_then_append)
+
+    store = StickyNoteStore(notes_file)
+
+    assert len(notes_file.read_text(encoding="utf-8").splitlines()) == 4
+    assert [(note.id, note.message) for note in store.all_notes()] == [("a", "A2"), ("b", "B")]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_sticky_note_store_ignores_private_fields_in_stored_lines(tmp_path):
+    notes_file = tmp_path / "sticky_notes.jsonl"
+    line = (
+        '{"id": "note-1", "message": "Note", "context_regex": "x", "created_at": "2025-01-01T00:00:00Z", '
+        '"_jsonl": "aGVsbG8=", "_pattern_error": "boom", "_pattern": null}\n'
+    )
+    notes_file.write_text(line + line.replace("note-1", "note-2"), encoding="utf-8")
+
+    store = StickyNoteStore(notes_file)
+    notes = store.all_notes()
+
+    assert [note.id for note in notes] == ["note-1", "note-2"]
+    assert notes[0].pattern.search("x")
+    assert notes[0].as_jsonl_bytes() == StickyNote(
+        id="note-1", message="Note", context_regex="x", created_at=datetime(2025, 1, 1, tzinfo=timezone.utc)
+    ).as_jsonl_bytes()
+    assert next(store.iter_notes()).pattern.search("x")
+
+
+def test_sticky_note_store_keeps_lines_aligned_when_one_holds_several_values(tmp_path):
+    notes_file = tmp_path / "sticky_notes.jsonl"
+    note = '{"id": "%s", "message": "Note", "context_regex": "x", "created_at": "2025-01-01T00:00:00Z"}'
+    notes_file.write_text(
+        "\n".join([f"{note % 'a'}, {note % 'a2'}", note % "b", note % "c"]) + "\n",
+        encoding="utf-8",
+    )
+
+    store = StickyNoteStore(notes_file)
+
+    assert [note.id for note in store.all_notes()] == ["b", "c"]
+    assert [note.id for note in store.all_notes()] == [note.id for note in store.iter_notes()]
+
+
+def test_sticky_note_store_compaction_keeps_lines_that_do_not_decode(tmp_path):
+    notes_file = tmp_path / "sticky_notes.jsonl"
+    note = '{"id": "%s", "message": "%s", "context_regex": "x", "created_at": "2025-01-01T00:00:00Z"}'
+    typo = '{"id": "typo", "message": "Fix me" "context_regex": "x"}'
+    notes_file.write_text(
+        "\n".join([note % ("a", "A0"), typo, note % ("a", "A1"), note % ("a", "A2"), "not json"]) + "\n",
+        encoding="utf-8",
+    )
+
+    store = StickyNoteStore(notes_file)
+
+    assert [(note.id, note.message) for note in store.all_notes()] == [("a", "A2")]
+    lines = notes_file.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 3
+    assert lines[1:] == [typo, "not json"]
+
+
+def test_sticky_note_store_compaction_keeps_original_lines(tmp_path):
+    notes_file = tmp_path / "sticky_notes.jsonl"
+    note = '{"id": "a", "message": "%s", "context_regex": "x", "created_at": "2025-01-01T02:00:00+02:00"%s}'
+    newest = note % ("New", ', "tags": ["hand-added"]')
+    notes_file.write_text("\n".join([note % ("Old", ""), note % ("Older", ""), newest]) + "\n", encoding="utf-8")
+
+    store = StickyNoteStore(notes_file)
+
+    assert notes_file.read_text(encoding="utf-8") == newest + "\n"
+    assert [note.message for note in store.all_notes()] == ["New"]